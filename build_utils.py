@@ -0,0 +1,34 @@
+# Output helpers shared by the ROM generators (char_convert.py, colorgen.py):
+# generated files are replaced atomically and keep their permissions, and the
+# hash of the inputs they were built from is kept next to them.
+import os
+import tempfile
+
+
+def hash_file(path):
+    d, f = os.path.split(path)
+    return os.path.join(d, "." + f + ".hash")
+
+
+# mode of the file being replaced, or 0644 under the umask for new files
+def file_mode(path):
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o644 & ~umask
+
+
+# replace path with data (str or bytes) so that readers never see a partial file
+def write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp.")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        # mkstemp creates files with mode 0600
+        os.chmod(tmp, file_mode(path))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# Timestamped capture of the byte stream sent to the char matrix.
+#
+# File layout: the 4-byte magic "CMXC", a version byte and the baud rate as a
+# little-endian uint32, followed by one record per byte: the time elapsed
+# since the previous byte in microseconds as an unsigned LEB128 varint, then
+# the byte itself. At line rate a record takes 3 bytes.
+#
+#   python capture.py trace.cap            # summary
+#   python capture.py trace.cap --dump     # one "time_us byte" line per record
+import argparse
+import struct
+import time
+
+MAGIC = b"CMXC"
+VERSION = 1
+HEADER = struct.Struct("<4sBI")
+
+
+class CaptureWriter():
+    def __init__(self, path, baud=9600):
+        self.f = open(path, "wb")
+        self.f.write(HEADER.pack(MAGIC, VERSION, baud))
+        self.t0 = None
+        self.t_last = 0
+
+    # record bytes written at time t (seconds, time.monotonic() by default)
+    def write(self, data, t=None):
+        if t is None:
+            t = time.monotonic()
+        if self.t0 is None:
+            self.t0 = t
+        t_us = max(self.t_last, int((t - self.t0) * 1e6))
+        out = bytearray()
+        for b in data:
+            delta = t_us - self.t_last
+            self.t_last = t_us
+            while delta >= 0x80:
+                out.append((delta & 0x7F) | 0x80)
+                delta >>= 7
+            out.append(delta)
+            out.append(b)
+        self.f.write(out)
+
+    def close(self):
+        self.f.close()
+
+
+def read_header(f):
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{f.name}: not a capture file (too short)")
+    magic, version, baud = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{f.name}: not a capture file (version {VERSION})")
+    return baud
+
+
+# stream (time_us, byte) records from a capture without loading it in memory
+def read_capture(path, chunk_size=1 << 16):
+    with open(path, "rb") as f:
+        read_header(f)
+        t_us = 0
+        delta = shift = 0
+        want_byte = False
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            for b in chunk:
+                if want_byte:
+                    yield t_us, b
+                    want_byte = False
+                elif b & 0x80:
+                    delta |= (b & 0x7F) << shift
+                    shift += 7
+                else:
+                    t_us += delta | (b << shift)
+                    delta = shift = 0
+                    want_byte = True
+        if want_byte or shift:
+            raise ValueError(f"{path}: truncated record")
+
+
+def capture_baud(path):
+    with open(path, "rb") as f:
+        return read_header(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a char matrix serial capture")
+    parser.add_argument("file")
+    parser.add_argument("--dump", action="store_true", help="print every record")
+    args = parser.parse_args()
+
+    n = 0
+    t_us = 0
+    for t_us, b in read_capture(args.file):
+        n += 1
+        if args.dump:
+            print(f"{t_us} {b:#04x}")
+    print(f"{n} bytes over {t_us / 1e6:.3f} s at {capture_baud(args.file)} baud")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+#!/usr/bin/env python
+# Character ROM compaction analysis.
+#
+# Looks for redundancy in the glyphs exported by char_convert.py (repeated
+# columns, shared rows, empty borders, duplicate and near-duplicate glyphs)
+# and compares compressed ROM schemes against the flat char_rom, in storage
+# bits and in estimated decode depth. Each scheme can be emitted as a Verilog
+# module named char_rom, with the same ports and parameters, which can be
+# swapped in for src/char_rom.v. Every scheme's Python decoder is checked
+# against the flat ROM on the tables read back from the emitted file; if
+# iverilog is installed the emitted module itself is also simulated at every
+# address.
+#
+#   python char_compact.py                          # full font, addresses 0..255
+#   python char_compact.py --min 32 --max 126       # current font.bin range
+#   python char_compact.py --emit build/            # also write and check char_rom_<scheme>.v
+#   python char_compact.py --emit build/ --simulate # ... and require the iverilog simulation (CI)
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+
+from char_convert import rom_words, rom_glyph_columns, glyph_pixels, CHAR_W, CHAR_H, DATA_WIDTH
+
+BLOCK = 16          # glyphs per rank block in split schemes
+NO_PIXEL = 63       # unused pixel slot in a delta entry (1 << 63 is outside the glyph)
+
+
+def bits_for(n):
+    return max(1, int(np.ceil(np.log2(n))))
+
+def popcount(words):
+    return np.unpackbits(words.astype(np.uint64).view(np.uint8)).reshape(*words.shape, 64).sum(axis=-1)
+
+
+# Rough critical path in 2-input gate levels: an n-entry table is a tree of
+# 2:1 muxes (2 levels each), a w-bit add or compare a parallel-prefix adder.
+def rom_depth(n):
+    return 2 * bits_for(n)
+
+def add_depth(w):
+    return 2 * bits_for(w) + 2
+
+
+# first and last used row and column of every glyph (0, -1 for blank glyphs)
+def bounding_boxes(pixels):
+    rows = pixels.any(axis=2)
+    cols = pixels.any(axis=1)
+    top, left = rows.argmax(axis=1), cols.argmax(axis=1)
+    bottom = CHAR_H - 1 - rows[:, ::-1].argmax(axis=1)
+    right = CHAR_W - 1 - cols[:, ::-1].argmax(axis=1)
+    blank = ~rows.any(axis=1)
+    bottom[blank] = right[blank] = -1
+    return top, bottom, left, right
+
+
+def analyze(addr_min, addr_max):
+    g = rom_glyph_columns(addr_min, addr_max)
+    pixels = glyph_pixels(g)
+    rows = (pixels << np.arange(CHAR_W, dtype=np.uint8)).sum(axis=2)   # (n, 7) 5-bit rows
+    words = rom_words(addr_min, addr_max)
+    top, bottom, left, right = bounding_boxes(pixels)
+
+    dist = popcount(words[:, None] ^ words[None, :])
+    upper = np.triu(np.ones(dist.shape, dtype=bool), 1)
+
+    return {
+        "glyphs": len(g),
+        "unique glyphs": len(np.unique(words)),
+        "unique columns": len(np.unique(g)),
+        "unique rows": len(np.unique(rows)),
+        "glyphs with empty left column": int((g[:, 0] == 0).sum()),
+        "glyphs with empty right column": int((g[:, -1] == 0).sum()),
+        "glyphs with empty top row": int((rows[:, 0] == 0).sum()),
+        "glyphs with empty bottom row": int((rows[:, -1] == 0).sum()),
+        "glyphs at most 5 rows high": int((bottom - top < 5).sum()),
+        "glyphs at most 4 columns wide": int((right - left < 4).sum()),
+        "glyph pairs 1 pixel apart": int(((dist == 1) & upper).sum()),
+        "glyph pairs 2 pixels apart": int(((dist == 2) & upper).sum()),
+    }
+
+
+# A scheme is a set of ROM tables plus a decoder. Tables are lists of ints
+# with a bit width; decode() is a Python model of the decode logic emitted by
+# verilog_decode(), so that the check can run on tables read back from the
+# .v file.
+class Scheme():
+    name = None
+
+    def __init__(self, addr_min, addr_max):
+        self.addr_min = addr_min
+        self.addr_max = addr_max
+        self.n = addr_max - addr_min + 2     # glyphs including the fallback
+        self.tables = {}     # name -> (width, values)
+
+    # the variants of a scheme worth comparing; the smallest one is reported
+    @classmethod
+    def candidates(cls, addr_min, addr_max):
+        yield cls(addr_min, addr_max)
+
+    @classmethod
+    def smallest(cls, addr_min, addr_max):
+        return min(cls.candidates(addr_min, addr_max), key=lambda s: s.storage_bits())
+
+    def storage_bits(self):
+        return sum(width * len(values) for width, values in self.tables.values())
+
+    def index(self, address):
+        if self.addr_min <= address <= self.addr_max:
+            return address - self.addr_min
+        return self.addr_max - self.addr_min + 1
+
+    # range check and subtraction in parallel, then a 2:1 mux
+    def index_depth(self):
+        return add_depth(8) + 2
+
+    def verilog_tables(self):
+        lines = []
+        for name, (width, values) in self.tables.items():
+            lines.append(f"reg [{width - 1}:0] {name} [0:{len(values) - 1}];")
+        lines.append("")
+        lines.append("initial begin")
+        for name, (width, values) in self.tables.items():
+            for i, v in enumerate(values):
+                lines.append(f"    {name}[{i}] = {width}'b{v:0{width}b};")
+        lines.append("end")
+        return "\n".join(lines)
+
+    def verilog(self):
+        return f"""// generated by char_compact.py: {self.description}
+// same interface as src/char_rom.v, addresses {self.addr_min}..{self.addr_max}
+module char_rom #(
+    parameter DATA_WIDTH = {DATA_WIDTH},     // Width of ROM data (35 bits for each character)
+    parameter ADDR_WIDTH = 8       // Address width
+)(
+    input wire [ADDR_WIDTH-1:0] address,
+    output wire [DATA_WIDTH-1:0] data
+);
+
+localparam ADDR_MIN = {self.addr_min};
+localparam ADDR_MAX = {self.addr_max};
+
+{self.verilog_tables()}
+
+wire [ADDR_WIDTH:0] index;
+assign index = (address >= ADDR_MIN && address <= ADDR_MAX) ? address-ADDR_MIN : ADDR_MAX-ADDR_MIN+1;
+
+{self.verilog_decode()}
+
+endmodule
+"""
+
+
+class FlatScheme(Scheme):
+    name = "flat"
+    description = "one 35-bit word per glyph, as char_rom"
+
+    def __init__(self, addr_min, addr_max):
+        super().__init__(addr_min, addr_max)
+        self.tables["mem"] = (DATA_WIDTH, [int(w) for w in rom_words(addr_min, addr_max)])
+
+    def decode(self, tables, address):
+        return tables["mem"][1][self.index(address)]
+
+    def depth(self):
+        return self.index_depth() + rom_depth(self.n)
+
+    def verilog_decode(self):
+        return "assign data = mem[index];"
+
+
+class GlyphDictScheme(Scheme):
+    name = "glyphdict"
+    description = "index into a table of unique glyphs"
+
+    def __init__(self, addr_min, addr_max):
+        super().__init__(addr_min, addr_max)
+        words = rom_words(addr_min, addr_max)
+        unique, idx = np.unique(words, return_inverse=True)
+        self.tables["glyph_index"] = (bits_for(len(unique)), [int(i) for i in idx])
+        self.tables["glyph"] = (DATA_WIDTH, [int(w) for w in unique])
+
+    def decode(self, tables, address):
+        return tables["glyph"][1][tables["glyph_index"][1][self.index(address)]]
+
+    def depth(self):
+        return self.index_depth() + rom_depth(self.n) + rom_depth(len(self.tables["glyph"][1]))
+
+    def verilog_decode(self):
+        return "assign data = glyph[glyph_index[index]];"
+
+
+class ColumnDictScheme(Scheme):
+    name = "coldict"
+    description = "5 indices per glyph into a table of unique 7-bit columns"
+
+    def __init__(self, addr_min, addr_max):
+        super().__init__(addr_min, addr_max)
+        g = rom_glyph_columns(addr_min, addr_max)
+        unique, idx = np.unique(g, return_inverse=True)
+        idx = idx.reshape(g.shape)
+        self.iw = bits_for(len(unique))
+        # column c index in bits [c*iw +: iw]
+        packed = (idx.astype(np.int64) << (self.iw * np.arange(CHAR_W))).sum(axis=1)
+        self.tables["col_index"] = (CHAR_W * self.iw, [int(i) for i in packed])
+        self.tables["col"] = (CHAR_H, [int(c) for c in unique])
+
+    def decode(self, tables, address):
+        width, col_index = tables["col_index"]
+        iw = width // CHAR_W
+        cols = [tables["col"][1][(col_index[self.index(address)] >> (c * iw)) & ((1 << iw) - 1)] for c in range(CHAR_W)]
+        # data bit row*5+col is pixel (row, col)
+        return sum(((cols[c] >> r) & 1) << (r * CHAR_W + c) for r in range(CHAR_H) for c in range(CHAR_W))
+
+    def depth(self):
+        return self.index_depth() + rom_depth(self.n) + rom_depth(len(self.tables["col"][1]))
+
+    def verilog_decode(self):
+        iw = self.iw
+        lines = [f"wire [{CHAR_W * iw - 1}:0] cidx;", "assign cidx = col_index[index];", ""]
+        for c in range(CHAR_W):
+            lines.append(f"wire [{CHAR_H - 1}:0] c{c};")
+            lines.append(f"assign c{c} = col[cidx[{(c + 1) * iw - 1}:{c * iw}]];")
+        bits = [f"c{c}[{r}]" for r in reversed(range(CHAR_H)) for c in reversed(range(CHAR_W))]
+        lines.append("")
+        lines.append("// row-major: data[row*5+col] = c<col>[row]")
+        lines.append("assign data = {" + ", ".join(bits) + "};")
+        return "\n".join(lines)
+
+
+class RowDictScheme(Scheme):
+    name = "rowdict"
+    description = "7 indices per glyph into a table of unique 5-bit rows"
+
+    def __init__(self, addr_min, addr_max):
+        super().__init__(addr_min, addr_max)
+        pixels = glyph_pixels(rom_glyph_columns(addr_min, addr_max))
+        rows = (pixels << np.arange(CHAR_W, dtype=np.uint8)).sum(axis=2)
+        unique, idx = np.unique(rows, return_inverse=True)
+        idx = idx.reshape(rows.shape)
+        self.iw = bits_for(len(unique))
+        packed = (idx.astype(np.int64) << (self.iw * np.arange(CHAR_H))).sum(axis=1)
+        self.tables["row_index"] = (CHAR_H * self.iw, [int(i) for i in packed])
+        self.tables["row"] = (CHAR_W, [int(r) for r in unique])
+
+    def decode(self, tables, address):
+        width, row_index = tables["row_index"]
+        iw = width // CHAR_H
+        rows = [tables["row"][1][(row_index[self.index(address)] >> (r * iw)) & ((1 << iw) - 1)] for r in range(CHAR_H)]
+        return sum(rows[r] << (r * CHAR_W) for r in range(CHAR_H))
+
+    def depth(self):
+        return self.index_depth() + rom_depth(self.n) + rom_depth(len(self.tables["row"][1]))
+
+    def verilog_decode(self):
+        iw = self.iw
+        lines = [f"wire [{CHAR_H * iw - 1}:0] ridx;", "assign ridx = row_index[index];", ""]
+        for r in range(CHAR_H):
+            lines.append(f"wire [{CHAR_W - 1}:0] r{r};")
+            lines.append(f"assign r{r} = row[ridx[{(r + 1) * iw - 1}:{r * iw}]];")
+        lines.append("")
+        lines.append("assign data = {" + ", ".join(f"r{r}" for r in reversed(range(CHAR_H))) + "};")
+        return "\n".join(lines)
+
+
+# Glyphs split between two tables with no per-glyph index: a 1-bit flag per
+# glyph marks the selected ones, and the table "sel" holds, for every block of
+# BLOCK glyphs, the flags and the number of selected glyphs before the block.
+# Selected glyph i is entry rank(i) of one table, the others entry i - rank(i)
+# of the other.
+class SplitScheme(Scheme):
+    def split(self, selected):
+        self.rw = bits_for(int(selected.sum()) + 1)
+        words = []
+        for b in range(0, self.n, BLOCK):
+            flags = sum(int(s) << i for i, s in enumerate(selected[b:b + BLOCK]))
+            words.append(int(selected[:b].sum()) << BLOCK | flags)
+        self.tables["sel"] = (BLOCK + self.rw, words)
+
+    # (rank, flag) of glyph i
+    def rank(self, tables, i):
+        word = tables["sel"][1][i // BLOCK]
+        flags = word & ((1 << BLOCK) - 1)
+        return (word >> BLOCK) + bin(flags & ((1 << (i % BLOCK)) - 1)).count("1"), (flags >> (i % BLOCK)) & 1
+
+    # block lookup, masked popcount of BLOCK flags as an adder tree, plus the
+    # block rank, minus from the index
+    def rank_depth(self):
+        popcount = add_depth(4) + 1 + sum(add_depth(w) for w in range(1, bits_for(BLOCK) + 1))
+        return self.index_depth() + rom_depth(len(self.tables["sel"][1])) + popcount + add_depth(self.rw) + add_depth(9)
+
+    def verilog_rank(self):
+        lb = bits_for(BLOCK)
+        return f"""wire [{BLOCK + self.rw - 1}:0] sel_word;
+assign sel_word = sel[index[ADDR_WIDTH:{lb}]];
+
+// selected glyphs before this one
+reg [{self.rw - 1}:0] rank;
+integer i;
+always @* begin
+    rank = sel_word[{BLOCK + self.rw - 1}:{BLOCK}];
+    for (i = 0; i < {BLOCK}; i = i + 1)
+        if (i < index[{lb - 1}:0])
+            rank = rank + sel_word[i];
+end
+
+wire selected;
+assign selected = sel_word[index[{lb - 1}:0]];
+
+wire [ADDR_WIDTH:0] rest;
+assign rest = index - rank;"""
+
+
+class TrimScheme(SplitScheme):
+    name = "trim"
+
+    # Glyphs that fit an h x w window are stored as the window plus its
+    # offset, the others as full words
+    def __init__(self, addr_min, addr_max, h, w):
+        super().__init__(addr_min, addr_max)
+        self.description = f"glyphs that fit a {h}x{w} window stored trimmed, the others flat"
+        top, bottom, left, right = bounding_boxes(glyph_pixels(rom_glyph_columns(addr_min, addr_max)))
+        words = rom_words(addr_min, addr_max)
+        self.h, self.w = h, w
+        self.ty = int(np.ceil(np.log2(CHAR_H - h + 1)))    # offset bits, 0 if the window spans the glyph
+        self.tx = int(np.ceil(np.log2(CHAR_W - w + 1)))
+        fits = (bottom - top < h) & (right - left < w)
+        # blank glyphs fit at offset 0; clamp the others so the window stays inside the glyph
+        top = np.minimum(np.where(bottom < 0, 0, top), CHAR_H - h)
+        left = np.minimum(np.where(right < 0, 0, left), CHAR_W - w)
+
+        trimmed = []
+        for i in np.flatnonzero(fits):
+            window = sum(((int(words[i]) >> ((top[i] + r) * CHAR_W + left[i] + c)) & 1) << (r * w + c)
+                         for r in range(h) for c in range(w))
+            trimmed.append(window | int(top[i]) << (h * w) | int(left[i]) << (h * w + self.ty))
+        self.split(fits)
+        self.tables["trim"] = (h * w + self.ty + self.tx, trimmed)
+        self.tables["mem"] = (DATA_WIDTH, [int(words[i]) for i in np.flatnonzero(~fits)])
+
+    @classmethod
+    def candidates(cls, addr_min, addr_max):
+        for h in range(1, CHAR_H + 1):
+            for w in range(1, CHAR_W + 1):
+                if (h, w) != (CHAR_H, CHAR_W):
+                    yield cls(addr_min, addr_max, h, w)
+
+    def decode(self, tables, address):
+        rank, selected = self.rank(tables, self.index(address))
+        if not selected:
+            return tables["mem"][1][self.index(address) - rank]
+        entry = tables["trim"][1][rank]
+        hw = self.h * self.w
+        top = (entry >> hw) & ((1 << self.ty) - 1)
+        left = (entry >> (hw + self.ty)) & ((1 << self.tx) - 1)
+        data = sum(((entry >> (r * self.w + c)) & 1) << (r * CHAR_W + c) for r in range(self.h) for c in range(self.w))
+        return data << (top * CHAR_W + left)
+
+    # the trim and mem lookups run in parallel; shift amount top*5+left,
+    # barrel shift, final 2:1 mux
+    def depth(self):
+        shift = (CHAR_H - self.h) * CHAR_W + CHAR_W - self.w
+        lookup = max(rom_depth(len(self.tables["trim"][1])) + add_depth(6) + 2 * bits_for(shift + 1),
+                     rom_depth(len(self.tables["mem"][1])))
+        return self.rank_depth() + lookup + 2
+
+    def verilog_decode(self):
+        h, w, hw = self.h, self.w, self.h * self.w
+        top = f"entry[{hw + self.ty - 1}:{hw}]" if self.ty else "0"
+        left = f"entry[{hw + self.ty + self.tx - 1}:{hw + self.ty}]" if self.tx else "0"
+        pad = f"{CHAR_W - w}'b0, " if w < CHAR_W else ""
+        rows = ", ".join(f"{pad}entry[{(r + 1) * w - 1}:{r * w}]" for r in reversed(range(h)))
+        if h < CHAR_H:
+            rows = f"{(CHAR_H - h) * CHAR_W}'b0, " + rows
+        return f"""{self.verilog_rank()}
+
+wire [{self.tables['trim'][0] - 1}:0] entry;
+assign entry = trim[rank];
+
+// window rows padded to 5 columns, then moved to the glyph offset
+wire [DATA_WIDTH-1:0] window;
+assign window = {{{rows}}};
+
+assign data = selected ? window << ({top} * {CHAR_W} + {left}) : mem[rest];"""
+
+
+class DeltaScheme(SplitScheme):
+    name = "delta"
+
+    # Glyphs within k pixels of an earlier base glyph are stored as the base
+    # index plus the positions of the pixels that differ, the others as full
+    # words
+    def __init__(self, addr_min, addr_max, k):
+        super().__init__(addr_min, addr_max)
+        self.description = f"glyphs within {k} pixels of an earlier glyph stored as base + pixel flips, the others flat"
+        words = rom_words(addr_min, addr_max)
+        dist = popcount(words[:, None] ^ words[None, :])
+        self.k = k
+        base = []           # glyph numbers of the full words
+        deltas = []         # (base table index, differing pixels)
+        selected = np.zeros(self.n, dtype=bool)
+        for i in range(self.n):
+            near = [j for j, b in enumerate(base) if dist[i, b] <= k]
+            if not near:
+                base.append(i)
+                continue
+            j = min(near, key=lambda j: dist[i, base[j]])
+            diff = int(words[i]) ^ int(words[base[j]])
+            pixels = [p for p in range(DATA_WIDTH) if diff >> p & 1]
+            deltas.append((j, pixels + [NO_PIXEL] * (k - len(pixels))))
+            selected[i] = True
+
+        self.bw = bits_for(len(base))
+        self.split(selected)
+        self.tables["delta"] = (self.bw + 6 * k, [j | sum(p << (self.bw + 6 * s) for s, p in enumerate(pixels))
+                                                  for j, pixels in deltas])
+        self.tables["mem"] = (DATA_WIDTH, [int(words[i]) for i in base])
+
+    @classmethod
+    def candidates(cls, addr_min, addr_max):
+        for k in range(1, 5):
+            yield cls(addr_min, addr_max, k)
+
+    def decode(self, tables, address):
+        rank, selected = self.rank(tables, self.index(address))
+        mem = tables["mem"][1]
+        if not selected:
+            return mem[self.index(address) - rank]
+        entry = tables["delta"][1][rank]
+        data = mem[entry & ((1 << self.bw) - 1)]
+        for s in range(self.k):
+            data ^= (1 << ((entry >> (self.bw + 6 * s)) & 63)) & ((1 << DATA_WIDTH) - 1)
+        return data
+
+    # delta lookup, then the base lookup in parallel with decoding the pixel
+    # positions, XOR tree, final 2:1 mux
+    def depth(self):
+        base = rom_depth(len(self.tables["mem"][1]))
+        return self.rank_depth() + rom_depth(len(self.tables["delta"][1])) + max(base, 4) + bits_for(self.k + 1) + 2
+
+    def verilog_decode(self):
+        bw = self.bw
+        flips = " ^ ".join(f"({DATA_WIDTH}'b1 << entry[{bw + 6 * s + 5}:{bw + 6 * s}])" for s in range(self.k))
+        return f"""{self.verilog_rank()}
+
+wire [{self.tables['delta'][0] - 1}:0] entry;
+assign entry = delta[rank];
+
+// flip the differing pixels of the base glyph ({NO_PIXEL} = no pixel)
+wire [DATA_WIDTH-1:0] near;
+assign near = mem[entry[{bw - 1}:0]] ^ {flips};
+
+assign data = selected ? near : mem[rest];"""
+
+
+SCHEMES = [FlatScheme, GlyphDictScheme, ColumnDictScheme, RowDictScheme, TrimScheme, DeltaScheme]
+
+
+# read the ROM tables back from an emitted Verilog file
+def read_verilog_tables(path):
+    tables = {}
+    for name, i, width, bits in re.findall(r"^\s*(\w+)\[(\d+)\] = (\d+)'b([01]+);", open(path).read(), re.M):
+        values = tables.setdefault(name, (int(width), []))[1]
+        assert int(i) == len(values)
+        values.append(int(bits, 2))
+    return tables
+
+
+# compare a scheme's decoder against the flat ROM at every 8-bit address
+def check(scheme, tables):
+    words = rom_words(scheme.addr_min, scheme.addr_max)
+    flat = FlatScheme(scheme.addr_min, scheme.addr_max)
+    bad = [a for a in range(256) if scheme.decode(tables, a) != int(words[flat.index(a)])]
+    return bad
+
+
+# simulate an emitted module with iverilog at every 8-bit address and return
+# the addresses where it differs from the flat ROM (None without iverilog)
+def simulate(scheme, path):
+    if shutil.which("iverilog") is None:
+        return None
+    tb = f"""module tb;
+reg [7:0] address;
+wire [{DATA_WIDTH - 1}:0] data;
+char_rom #(.DATA_WIDTH({DATA_WIDTH}), .ADDR_WIDTH(8)) rom (.address(address), .data(data));
+integer a;
+initial begin
+    for (a = 0; a < 256; a = a + 1) begin
+        address = a;
+        #1 $display("%b", data);
+    end
+end
+endmodule
+"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "tb.v"), "w") as f:
+            f.write(tb)
+        subprocess.run(["iverilog", "-o", os.path.join(tmp, "tb"), os.path.join(tmp, "tb.v"), path], check=True)
+        out = subprocess.run(["vvp", "-n", os.path.join(tmp, "tb")], check=True, capture_output=True, text=True).stdout
+    got = re.findall(rf"^[01xz]{{{DATA_WIDTH}}}$", out, re.M)
+    words = rom_words(scheme.addr_min, scheme.addr_max)
+    flat = FlatScheme(scheme.addr_min, scheme.addr_max)
+    return [a for a in range(256) if a >= len(got) or got[a] != f"{int(words[flat.index(a)]):0{DATA_WIDTH}b}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze character ROM redundancy and compare compressed ROM schemes")
+    parser.add_argument("--min", type=int, default=0, help="first exported address")
+    parser.add_argument("--max", type=int, default=255, help="last exported address")
+    parser.add_argument("--emit", metavar="DIR", help="write char_rom_<scheme>.v files to DIR and check them")
+    parser.add_argument("--simulate", action="store_true", help="with --emit, fail if iverilog is not available to simulate them")
+    args = parser.parse_args()
+    if args.simulate and not args.emit:
+        parser.error("--simulate needs --emit")
+    if args.simulate and shutil.which("iverilog") is None:
+        parser.error("--simulate needs iverilog")
+
+    print(f"glyphs {args.min}..{args.max} + fallback")
+    for k, v in analyze(args.min, args.max).items():
+        print(f"  {k:32} {v}")
+    print()
+
+    flat_bits = None
+    simulated = 0
+    print(f"  {'scheme':12} {'bits':>7} {'vs flat':>8} {'depth':>6}  tables")
+    for cls in SCHEMES:
+        scheme = cls.smallest(args.min, args.max)
+        bits = scheme.storage_bits()
+        flat_bits = flat_bits or bits
+        tables = ", ".join(f"{name} {len(v)}x{w}" for name, (w, v) in scheme.tables.items())
+        print(f"  {scheme.name:12} {bits:>7} {bits / flat_bits:>7.0%} {scheme.depth():>6}  {tables}")
+        print(f"  {'':12} {scheme.description}")
+
+        bad = check(scheme, scheme.tables)
+        assert not bad, f"{scheme.name}: decoder mismatch at addresses {bad}"
+
+        if args.emit:
+            os.makedirs(args.emit, exist_ok=True)
+            path = os.path.join(args.emit, f"char_rom_{scheme.name}.v")
+            with open(path, "w") as f:
+                f.write(scheme.verilog())
+            bad = check(scheme, read_verilog_tables(path))
+            assert not bad, f"{path}: table mismatch at addresses {bad}"
+            bad = simulate(scheme, path)
+            assert not bad, f"{path}: simulation mismatch at addresses {bad}"
+            simulated += bad is not None
+
+    print("\n  depth: estimated critical path in 2-input gate levels")
+    if args.emit:
+        print(f"\nwrote {len(SCHEMES)} ROM variants in {args.emit}, checked their tables"
+              + (f" and simulated {simulated}" if simulated else " (iverilog not found, decode logic not simulated)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,25 @@
+#!/usr/bin/env python
+# Font compiler for the character ROM.
+#
+# char_list holds the 5x7 glyphs as 5 column bytes each (bit 0 = top row).
+# The ROM stores one 35-bit word per character, row-major from the top-left
+# pixel (bit 0) to the bottom-right pixel (bit 34), for addresses
+# ADDR_MIN..ADDR_MAX followed by the glyph shown for any other address.
+# ADDR_MIN/ADDR_MAX below are the range of the in-tree ROM files: the
+# testbench reads them from here, and char_rom.v's defaults must match (build
+# checks it). To change the range, edit both.
+#
+#   python char_convert.py                   # rebuild src/font.bin and test/font.bin if needed
+#   python char_convert.py --stdout          # print the ROM image
+#   python char_convert.py --min 0 --max 255 -o full.bin   # other ranges, to other files only
+import argparse
+import hashlib
+import os
+import re
+import numpy as np
+
+from build_utils import write_atomic, hash_file
+
 char_list = [
     0x00, 0x00, 0x00, 0x00, 0x00,
 	0x3E, 0x5B, 0x4F, 0x5B, 0x3E,
@@ -256,18 +278,107 @@ char_list = [
 	0x00, 0x00, 0x00, 0x00, 0x00
 ]
 
-def hex_to_binary_row_major(hex_values):
-	seq = []
-	for row in range(7):
-		for col in range(5):
-			if hex_values[col] & (1 << row):
-				seq.append(1)
-			else:
-				seq.append(0)
-	return seq
 
-for i in range(32, 127):
-    bitseq = hex_to_binary_row_major(char_list[i*5 : (i+1)*5])
-    print ("".join(['%0d' % digit for digit in bitseq[::-1]]))
+# glyph for addresses outside the exported range: an empty rectangle
+BOX_GLYPH = [0x7F, 0x41, 0x41, 0x41, 0x7F]
+
+CHAR_W, CHAR_H = 5, 7
+DATA_WIDTH = CHAR_W * CHAR_H
+ADDR_MIN, ADDR_MAX = 32, 126
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ROM_FILES = [os.path.join(ROOT, "src", "font.bin"), os.path.join(ROOT, "test", "font.bin")]
+CHAR_ROM = os.path.join(ROOT, "src", "char_rom.v")
+
+
+# all 256 glyphs as an array of column bytes, shape (256, 5);
+# char_list stops at 254, glyph 255 is the empty rectangle
+def glyphs():
+    g = np.array(char_list, dtype=np.uint8).reshape(-1, CHAR_W)
+    pad = np.tile(np.array(BOX_GLYPH, dtype=np.uint8), (256 - len(g), 1))
+    return np.vstack([g, pad])
+
+
+# unpack column bytes to pixels, shape (n, 7, 5), and pack them row-major
+def glyph_pixels(g):
+    return (g[:, None, :] >> np.arange(CHAR_H, dtype=np.uint8)[:, None]) & 1
+
+def pack_rows(pixels):
+    weights = np.uint64(1) << np.arange(DATA_WIDTH, dtype=np.uint64)
+    return pixels.reshape(len(pixels), DATA_WIDTH).astype(np.uint64) @ weights
+
+
+# column bytes of the ROM glyphs for addresses addr_min..addr_max, followed by
+# the fallback glyph (bit 7 is below the 7 rows and dropped)
+def rom_glyph_columns(addr_min=ADDR_MIN, addr_max=ADDR_MAX):
+    if not 0 <= addr_min <= addr_max <= 255:
+        raise ValueError(f"invalid address range {addr_min}..{addr_max}")
+    return np.vstack([glyphs()[addr_min:addr_max + 1], [BOX_GLYPH]]).astype(np.uint8) & 0x7F
+
+
+# packed ROM words for addresses addr_min..addr_max, followed by the fallback glyph
+def rom_words(addr_min=ADDR_MIN, addr_max=ADDR_MAX):
+    return pack_rows(glyph_pixels(rom_glyph_columns(addr_min, addr_max)))
+
+
+def rom_image(words):
+    return "".join(format(int(w), f"0{DATA_WIDTH}b") + "\n" for w in words)
+
+
+def input_hash(addr_min, addr_max):
+    h = hashlib.sha256()
+    h.update(glyphs().tobytes())
+    h.update(bytes(BOX_GLYPH))
+    h.update(f"{addr_min},{addr_max},{DATA_WIDTH}".encode())
+    return h.hexdigest()
+
+
+# ADDR_MIN/ADDR_MAX parameter defaults of char_rom.v
+def char_rom_range(path=CHAR_ROM):
+    text = open(path).read()
+    return tuple(int(re.search(rf"parameter {name} = (\d+)", text).group(1)) for name in ("ADDR_MIN", "ADDR_MAX"))
+
+
+# write the ROM image to every path, unless all of them were built from the same input
+def build(paths=ROM_FILES, addr_min=ADDR_MIN, addr_max=ADDR_MAX, force=False):
+    if set(paths) & set(ROM_FILES):
+        if (addr_min, addr_max) != (ADDR_MIN, ADDR_MAX):
+            raise ValueError(f"the in-tree ROM files hold addresses {ADDR_MIN}..{ADDR_MAX}, "
+                             "change ADDR_MIN/ADDR_MAX in char_convert.py and char_rom.v instead")
+        if char_rom_range() != (ADDR_MIN, ADDR_MAX):
+            raise ValueError(f"{CHAR_ROM} has ADDR_MIN/ADDR_MAX {char_rom_range()}, "
+                             f"char_convert.py has {(ADDR_MIN, ADDR_MAX)}")
+    digest = input_hash(addr_min, addr_max)
+    if not force and all(os.path.exists(p) and os.path.exists(hash_file(p))
+                         and open(hash_file(p)).read() == digest for p in paths):
+        return False
+    image = rom_image(rom_words(addr_min, addr_max))
+    for p in paths:
+        write_atomic(p, image)
+        write_atomic(hash_file(p), digest)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the character ROM image")
+    parser.add_argument("--min", type=int, default=ADDR_MIN, help="first exported address")
+    parser.add_argument("--max", type=int, default=ADDR_MAX, help="last exported address")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the input is unchanged")
+    parser.add_argument("--stdout", action="store_true", help="print the ROM image instead of writing it")
+    parser.add_argument("-o", "--output", action="append", help="output file (default: src/font.bin and test/font.bin)")
+    args = parser.parse_args()
+
+    if args.stdout:
+        print(rom_image(rom_words(args.min, args.max)), end="")
+        return
+    paths = args.output or ROM_FILES
+    if not args.output and (args.min, args.max) != (ADDR_MIN, ADDR_MAX):
+        parser.error(f"--min/--max need --stdout or -o: src/font.bin and test/font.bin hold {ADDR_MIN}..{ADDR_MAX}")
+    if build(paths, args.min, args.max, args.force):
+        print(f"wrote {args.max - args.min + 2} glyphs to " + ", ".join(paths))
+    else:
+        print("font ROM up to date")
+
 
-print ("11111100011000110001100011000111111")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Model of how the char matrix handles the bytes it receives on UART RX, shared
+# by sender.py (mirror of the display) and the testbench's capture replay
+# (reference the decoded frames are checked against).
+#
+# Bytes with bit 7 set are color commands: the low 4 bits become the color of
+# the next characters (shown when ui[7] selects fixed colors). With ui[6] set,
+# CR and LF trigger a display refresh and are not stored. Every other byte is
+# written to the text buffer, a ring of num_chars characters that is shown
+# starting from the oldest one.
+
+CR, LF = 13, 10
+
+
+class ChipModel():
+    def __init__(self, num_chars=2, ext_refresh=False):
+        self.num_chars = num_chars
+        self.ext_refresh = ext_refresh
+        self.fixed_color = 0
+        # after reset the chip holds num_chars NUL characters with color 0
+        self.buf = [(0, 0)] * num_chars
+        self.base = 0       # oldest character, overwritten by the next one
+
+    # returns (position, (char, color)) if b was written to the text buffer
+    def apply(self, b):
+        if self.ext_refresh and b in (CR, LF):
+            return None
+        if b & 0x80:
+            self.fixed_color = b & 0x0F
+            return None
+        pos = self.base
+        self.buf[pos] = (b, self.fixed_color)
+        self.base = (pos + 1) % self.num_chars
+        return pos, self.buf[pos]
+
+    # (char, color) pairs in display order
+    @property
+    def chars(self):
+        return self.buf[self.base:] + self.buf[:self.base]
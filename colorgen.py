@@ -1,7 +1,156 @@
 #!/usr/bin/env python
-import colorsys
+# Palette generator for the color ROM.
+#
+# Computes the hue wheel, gamma correction and every dimmer level in one
+# vectorized pass, and emits src/color_rom.v (plus, optionally, the palette as
+# an emulator-ready numpy array of shape (dimmer, color, GRB)). The parameters
+# are recorded in the header of color_rom.v, and test.py builds its color
+# lookup table from color_table(**rom_params()), so that it always matches the
+# ROM under test; test_uart_dimmer checks every color at every dimmer level
+# against the chip. Outputs are only rewritten when the parameters change.
+#
+#   python colorgen.py                          # rebuild src/color_rom.v if needed
+#   python colorgen.py --gamma 2.2 --emulator palette.npy
+#   python colorgen.py --print                  # GRB bit strings, one per color
+import argparse
+import functools
+import hashlib
+import io
+import json
+import os
+import re
 import numpy as np
 
-for h in np.arange(0, 360, 360/16):
-    r, g, b = colorsys.hsv_to_rgb(h/360, 1, 0.8)
-    print (f'{int(g*255):>08b}{int(r*255):>08b}{int(b*255):>08b}')
\ No newline at end of file
+from build_utils import write_atomic, hash_file
+
+NUM_COLORS = 16
+SATURATION = 1.0
+VALUE = 0.8
+GAMMA = 1.0
+# color_rom: each channel is shifted right by {dimmer, 1'b0}
+DIMMER_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+COLOR_ROM = os.path.join(ROOT, "src", "color_rom.v")
+
+
+# GRB bytes for every dimmer level and color, shape (4, num_colors, 3)
+@functools.lru_cache()
+def palette(num_colors=NUM_COLORS, saturation=SATURATION, value=VALUE, gamma=GAMMA):
+    # HSV to RGB as in colorsys.hsv_to_rgb, for all hues at once
+    h = np.arange(0, 360, 360 / num_colors) / 360
+    i = (h * 6.0).astype(int)
+    f = h * 6.0 - i
+    v = np.full_like(h, value)
+    p = v * (1.0 - saturation)
+    q = v * (1.0 - saturation * f)
+    t = v * (1.0 - saturation * (1.0 - f))
+    i = i % 6
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+
+    grb = (np.stack([g, r, b], axis=-1) ** gamma * 255).astype(np.uint8)
+    dimmed = grb[None] >> DIMMER_SHIFTS[:, None, None]
+    dimmed.flags.writeable = False
+    return dimmed
+
+
+def grb_words(grb):
+    return [(int(g) << 16) | (int(r) << 8) | int(b) for g, r, b in grb]
+
+
+# lookup table for the testbench: COLOR_TABLE[dimmer][index] as a GRB bit string
+def color_table(num_colors=NUM_COLORS, saturation=SATURATION, value=VALUE, gamma=GAMMA):
+    return [[format(w, "024b") for w in grb_words(level)]
+            for level in palette(num_colors, saturation, value, gamma)]
+
+
+def color_rom_verilog(words, params):
+    mem = "".join(f"    mem[{i}] = 24'b{w:024b};\n" for i, w in enumerate(words))
+    return f"""// generated by colorgen.py with {json.dumps(params, sort_keys=True)}
+module color_rom #(
+    parameter DATA_WIDTH = 24,     // Width of ROM data
+    parameter ADDR_WIDTH = 4       // Address width
+)(
+    input wire [ADDR_WIDTH-1:0] address,
+    input wire [1:0] dimmer,
+    output wire [DATA_WIDTH-1:0] data
+);
+
+reg [DATA_WIDTH-1:0] mem [0:2**ADDR_WIDTH-1];
+
+wire [2:0] dimshift;
+assign dimshift[0] = 0;
+assign dimshift[2:1] = dimmer;
+
+assign data =   (mem[address][23:16] >> dimshift) << 16 |
+                (mem[address][15:8]  >> dimshift) << 8  |
+                (mem[address][7:0]   >> dimshift);
+
+initial begin
+{mem}end
+
+endmodule
+"""
+
+
+# palette parameters color_rom.v was generated with
+def rom_params(rom=COLOR_ROM):
+    with open(rom) as f:
+        m = re.match(r"// generated by colorgen.py with (\{.*\})$", f.readline())
+    if m is None:
+        raise ValueError(f"{rom}: no colorgen.py parameters, rebuild it with colorgen.py --force")
+    return json.loads(m.group(1))
+
+
+def input_hash(params):
+    return hashlib.sha256(repr(sorted(params.items())).encode()).hexdigest()
+
+
+def up_to_date(path, digest):
+    return os.path.exists(path) and os.path.exists(hash_file(path)) and open(hash_file(path)).read() == digest
+
+
+# rewrite the outputs that were not built from these parameters
+def build(params, rom=COLOR_ROM, emulator=None, force=False):
+    digest = input_hash(params)
+    outputs = [p for p in [rom, emulator] if p and (force or not up_to_date(p, digest))]
+    if not outputs:
+        return []
+
+    pal = palette(**params)
+    if rom in outputs:
+        write_atomic(rom, color_rom_verilog(grb_words(pal[0]), params))
+        write_atomic(hash_file(rom), digest)
+    if emulator in outputs:
+        buf = io.BytesIO()
+        np.save(buf, pal)
+        write_atomic(emulator, buf.getvalue())
+        write_atomic(hash_file(emulator), digest)
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the color ROM palette")
+    parser.add_argument("--saturation", type=float, default=SATURATION)
+    parser.add_argument("--value", type=float, default=VALUE)
+    parser.add_argument("--gamma", type=float, default=GAMMA, help="gamma correction exponent")
+    parser.add_argument("--emulator", metavar="FILE", help="also save the (dimmer, color, GRB) palette as a .npy array")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the parameters are unchanged")
+    parser.add_argument("--print", action="store_true", help="print the undimmed GRB bit strings instead of writing files")
+    args = parser.parse_args()
+
+    params = dict(saturation=args.saturation, value=args.value, gamma=args.gamma)
+    if args.print:
+        print("\n".join(color_table(**params)[0]))
+        return
+    outputs = build(params, emulator=args.emulator, force=args.force)
+    if outputs:
+        print("wrote " + ", ".join(outputs))
+    else:
+        print("color ROM up to date")
+
+
+if __name__ == "__main__":
+    main()
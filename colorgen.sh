@@ -1,2 +1,2 @@
 #!/bin/sh
-python colorgen.py  | awk '{print "colors[" NR-1 "] = 24\x27" "b" $1 ";"}'
+python colorgen.py --print | awk '{print "colors[" NR-1 "] = 24\x27" "b" $1 ";"}'
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# Windowed, acknowledged sender for the serial char matrix.
+#
+# With ui[2] set, the chip echoes every received byte on uo[4]. This sender
+# keeps up to WINDOW bytes in flight, matches each echo against what it sent,
+# and on a lost or corrupted byte rebuilds the display from the last
+# confirmed state before resending the unconfirmed bytes.
+#
+#   python sender.py /dev/ttyACM0 message.txt
+#   echo -n "Hello" | python sender.py /dev/ttyACM0 --window 8
+#   python sender.py --loopback --drop 0.01 --corrupt 0.01 message.txt
+#   python sender.py /dev/ttyACM0 message.txt --capture trace.cap
+import argparse
+import collections
+import os
+import random
+import select
+import sys
+import threading
+import time
+import serial
+from capture import CaptureWriter
+from chipmodel import ChipModel, CR
+
+BAUD = 9600
+BYTE_TIME = 10.0 / BAUD     # start bit + 8 data bits + stop bit
+
+
+# mirror of the chip's text and color buffers, fed with confirmed bytes only
+class DisplayState(ChipModel):
+    # bytes that bring the chip to this state, whatever its current state
+    # (in random color mode only the text is restored)
+    def replay(self):
+        out = bytearray()
+        color = None
+        for c, c_color in self.chars:
+            if c_color != color:
+                out.append(0x80 | c_color)
+                color = c_color
+            out.append(c)
+        if color != self.fixed_color:
+            out.append(0x80 | self.fixed_color)
+        if self.ext_refresh:
+            out.append(CR)
+        return bytes(out)
+
+
+class SendStats():
+    def __init__(self):
+        self.sent = 0           # bytes written, including retransmissions
+        self.confirmed = 0      # bytes confirmed by a matching echo
+        self.mismatches = 0     # echoes that did not match the oldest byte in flight
+        self.timeouts = 0       # bytes whose echo never came back
+        self.recoveries = 0
+        self.rtt = []           # write-to-echo latency of each confirmed byte (s)
+        self.elapsed = 0.0
+
+    def throughput(self):
+        return self.confirmed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def report(self):
+        lines = [
+            f"confirmed {self.confirmed} bytes in {self.elapsed:.3f} s "
+            f"({self.throughput():.1f} B/s, line max {1.0 / BYTE_TIME:.0f} B/s)",
+            f"sent {self.sent} bytes, {self.recoveries} recoveries "
+            f"({self.mismatches} mismatches, {self.timeouts} timeouts)",
+        ]
+        if self.rtt:
+            rtt = sorted(self.rtt)
+            p = lambda q: rtt[min(len(rtt) - 1, int(q * len(rtt)))] * 1e3
+            lines.append(f"rtt ms: min {rtt[0] * 1e3:.2f} median {p(0.5):.2f} "
+                         f"p99 {p(0.99):.2f} max {rtt[-1] * 1e3:.2f}")
+        return "\n".join(lines)
+
+
+# raised when recovery keeps failing, e.g. when the chip does not echo
+class SendError(Exception):
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+
+class WindowedSender():
+    # rto: minimum retransmission timeout in seconds; max_recoveries: number of
+    # consecutive recoveries without any confirmed payload byte before giving up
+    def __init__(self, port, window=16, display=None, rto=None, capture=None, max_recoveries=8):
+        if window < 1:
+            raise ValueError(f"window must be at least 1, not {window}")
+        self.port = port
+        self.window = window
+        self.max_recoveries = max_recoveries
+        self.capture = capture
+        self.display = display if display is not None else DisplayState()
+        self.stats = SendStats()
+        # retransmission timeout: the oldest byte in flight may queue behind
+        # a full window before it reaches the chip, then the echo takes a byte
+        self.min_rto = rto if rto is not None else (window + 2) * BYTE_TIME + 0.05
+        self.srtt = None
+        self.rttvar = 0.0
+
+    def rto(self):
+        if self.srtt is None:
+            return self.min_rto
+        return max(self.min_rto, self.srtt + 4 * self.rttvar)
+
+    def update_rtt(self, rtt):
+        self.stats.rtt.append(rtt)
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    # discard echoes until the line has been quiet for a few byte times
+    def drain(self):
+        quiet = 0.0
+        while quiet < 3 * BYTE_TIME + 0.02:
+            t = time.monotonic()
+            if self.port.read(max(1, self.port.in_waiting)):
+                quiet = 0.0
+            else:
+                quiet += time.monotonic() - t
+        self.port.reset_input_buffer()
+
+    def send(self, data):
+        stats = self.stats
+        # (byte, is payload): bytes replayed during recovery only restore state
+        pending = collections.deque((b, True) for b in data)
+        inflight = collections.deque()      # (byte, is payload, write time)
+        failed = 0                          # recoveries since the last confirmed payload byte
+        t_start = time.monotonic()
+
+        while pending or inflight:
+            # keep the window full
+            n = min(self.window - len(inflight), len(pending))
+            if n:
+                chunk = [pending.popleft() for _ in range(n)]
+                self.port.write(bytes(b for b, _ in chunk))
+                t = time.monotonic()
+                if self.capture:
+                    self.capture.write(bytes(b for b, _ in chunk), t)
+                inflight.extend((b, payload, t) for b, payload in chunk)
+                stats.sent += n
+
+            # match echoes against the oldest bytes in flight
+            echo = self.port.read(max(1, self.port.in_waiting))
+            t = time.monotonic()
+            error = False
+            for b in echo:
+                if not inflight or inflight[0][0] != b:
+                    stats.mismatches += 1
+                    error = True
+                    break
+                _, payload, t_sent = inflight.popleft()
+                self.display.apply(b)
+                self.update_rtt(t - t_sent)
+                stats.confirmed += payload
+                # bytes replayed during recovery do not show that it worked
+                if payload:
+                    failed = 0
+
+            if not error and inflight and t - inflight[0][2] > self.rto():
+                stats.timeouts += 1
+                error = True
+
+            if error:
+                # the chip state is unknown past the last confirmed byte:
+                # rebuild it, then resend everything not yet confirmed
+                stats.recoveries += 1
+                failed += 1
+                if failed > self.max_recoveries:
+                    stats.elapsed = time.monotonic() - t_start
+                    raise SendError(f"no payload byte confirmed after {self.max_recoveries} recoveries "
+                                    "(is UART echo enabled with ui[2] = 1?)", stats)
+                self.drain()
+                unconfirmed = [(b, payload) for b, payload, _ in inflight] + list(pending)
+                inflight.clear()
+                pending = collections.deque([(b, False) for b in self.display.replay()] + unconfirmed)
+
+        stats.elapsed = time.monotonic() - t_start
+        return stats
+
+
+# stand-in for the chip with UART echo enabled: echoes every byte written to a
+# pty at line rate, optionally dropping or corrupting some of them on the way
+# in, and keeps track of what the display would show
+class PtyLoopback():
+    def __init__(self, baud=BAUD, drop=0.0, corrupt=0.0, seed=None, display=None):
+        self.byte_time = 10.0 / baud
+        self.drop = drop
+        self.corrupt = corrupt
+        self.display = display if display is not None else DisplayState()
+        self.rng = random.Random(seed)
+        self.master, self.slave = os.openpty()
+        self.name = os.ttyname(self.slave)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        t_next = time.monotonic()
+        while not self.stop_event.is_set():
+            r, _, _ = select.select([self.master], [], [], 0.05)
+            if not r:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            for b in data:
+                # one byte per byte time, as the UART transmitter would
+                t_next = max(t_next + self.byte_time, time.monotonic())
+                time.sleep(max(0.0, t_next - time.monotonic()))
+                b = self.mangle(b)
+                if b is None:
+                    continue
+                self.display.apply(b)
+                os.write(self.master, bytes([b]))
+
+    # the byte as received by the chip, or None if it is lost
+    def mangle(self, b):
+        if self.rng.random() < self.drop:
+            return None
+        if self.rng.random() < self.corrupt:
+            b ^= 1 << self.rng.randrange(8)
+        return b
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send text to the char matrix, confirming every byte via UART echo (ui[2] = 1)")
+    parser.add_argument("port", nargs="?", help="serial port")
+    parser.add_argument("file", nargs="?", help="file to send (default: stdin)")
+    parser.add_argument("--window", type=int, default=16, help="max bytes in flight")
+    parser.add_argument("--rto", type=float, help="min retransmission timeout in seconds (raise it for simulated chips)")
+    parser.add_argument("--max-recoveries", type=int, default=8, help="consecutive failed recoveries before giving up")
+    parser.add_argument("--num-chars", type=int, default=2, choices=[2, 4, 6, 8], help="display size (ui[1:0])")
+    parser.add_argument("--ext-refresh", action="store_true", help="chip refreshes on CR/LF (ui[6] = 1)")
+    parser.add_argument("--loopback", action="store_true", help="send to a pty loopback instead of a serial port")
+    parser.add_argument("--capture", metavar="FILE", help="record every byte written, with timestamps")
+    parser.add_argument("--drop", type=float, default=0.0, help="loopback byte drop probability")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="loopback byte corruption probability")
+    args = parser.parse_args()
+    if args.window < 1:
+        parser.error("--window must be at least 1")
+
+    if args.loopback:
+        # with --loopback, a single positional argument is the file to send
+        args.file = args.file or args.port
+        loopback = PtyLoopback(drop=args.drop, corrupt=args.corrupt,
+                               display=DisplayState(args.num_chars, args.ext_refresh))
+        port_name = loopback.name
+    elif args.port:
+        loopback = None
+        port_name = args.port
+    else:
+        parser.error("a serial port or --loopback is required")
+
+    data = open(args.file, "rb").read() if args.file else sys.stdin.buffer.read()
+
+    s = serial.Serial(port_name, BAUD, 8, "N", 1, timeout=0.002)
+    capture = CaptureWriter(args.capture, BAUD) if args.capture else None
+    sender = WindowedSender(s, window=args.window,
+                            display=DisplayState(args.num_chars, args.ext_refresh),
+                            rto=args.rto, capture=capture, max_recoveries=args.max_recoveries)
+    try:
+        stats = sender.send(data)
+    except SendError as e:
+        print(e.stats.report())
+        sys.exit(f"error: {e}")
+    finally:
+        s.close()
+        if capture:
+            capture.close()
+        if loopback:
+            loopback.close()
+
+    print(stats.report())
+    if loopback:
+        ok = list(loopback.display.chars) == list(sender.display.chars)
+        print("loopback display " + ("matches" if ok else "DIFFERS from") + " confirmed state")
+
+
+if __name__ == "__main__":
+    main()
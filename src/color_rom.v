@@ -1,3 +1,4 @@
+// generated by colorgen.py with {"gamma": 1.0, "saturation": 1.0, "value": 0.8}
 module color_rom #(
     parameter DATA_WIDTH = 24,     // Width of ROM data
     parameter ADDR_WIDTH = 4       // Address width
@@ -0,0 +1,182 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: MIT
+
+# Trace of the events decoded by the testbench (LED matrix characters and
+# UART echoes) with their simulation time. RTL runs record it; gate-level runs
+# compare their own events against it as they are decoded, stop at the first
+# divergence and report the timing skew of every event relative to RTL.
+#
+# File layout: the 4-byte magic "CMXT" and a version byte, then records made
+# of a type byte and the time in ps since the start of the test (uint64),
+# followed by the payload:
+#   TEST  name length (uint16) + test name, starts the events of a test
+#   CHAR  bitmap (uint64, bit k = k-th character of the bitmap string) + GRB color (uint32, NO_COLOR if blank)
+#   ECHO  received byte (uint8)
+
+import atexit
+import io
+import os
+import struct
+
+from cocotb.utils import get_sim_time
+
+MAGIC = b"CMXT"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+RECORD = struct.Struct("<BQ")
+TEST, CHAR, ECHO = 0, 1, 2
+PAYLOAD = {TEST: struct.Struct("<H"), CHAR: struct.Struct("<QI"), ECHO: struct.Struct("<B")}
+NO_COLOR = 0xFFFFFFFF
+
+
+def describe(kind, payload):
+    if kind == CHAR:
+        bitmap, color = payload
+        return f"char {format(bitmap, '035b')[::-1]} color " + ("none" if color == NO_COLOR else f"{color:024b}")
+    if kind == ECHO:
+        return f"echo 0x{payload[0]:02X}"
+    return f"test {payload[0]}"
+
+
+def read_record(f):
+    head = f.read(RECORD.size)
+    if not head:
+        return None
+    kind, t_ps = RECORD.unpack(head)
+    payload = PAYLOAD[kind].unpack(f.read(PAYLOAD[kind].size))
+    if kind == TEST:
+        payload = (f.read(payload[0]).decode(),)
+    return kind, t_ps, payload
+
+
+# events of every test in a recording, as raw records
+def read_sections(path):
+    sections = {}
+    with open(path, "rb") as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a frame trace (version {VERSION})")
+        data = f.read()
+    f = io.BytesIO(data)
+    name = start = None
+    while True:
+        pos = f.tell()
+        record = read_record(f)
+        if name is not None and (record is None or record[0] == TEST):
+            sections[name] = data[start:pos]
+        if record is None:
+            return sections
+        if record[0] == TEST:
+            name, start = record[2][0], f.tell()
+
+
+def test_record(name):
+    return RECORD.pack(TEST, 0) + PAYLOAD[TEST].pack(len(name)) + name.encode()
+
+
+class FrameTrace():
+    # compare=False records to path, replacing the events of the tests that
+    # run and keeping the others; compare=True diffs against the recording
+    # at path (with a warning if there is none)
+    def __init__(self, path, compare=False):
+        self.path = path
+        self.compare = compare
+        self.f = None
+        self.log = None
+        self.name = None
+        self.missing = not os.path.exists(path)
+        self.warned = False
+        self.sections = {} if self.missing else read_sections(path)
+        atexit.register(self.end)
+
+    # rewrite the recording without the current test, then append its events
+    # as they come, so that the file is complete even if the run is cut short
+    def rewrite(self):
+        self.sections.pop(self.name, None)
+        if self.f is not None:
+            self.f.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION))
+            for name, events in self.sections.items():
+                f.write(test_record(name) + events)
+            f.write(test_record(self.name))
+        os.replace(tmp, self.path)
+        self.f = open(self.path, "ab")
+        self.events = bytearray()
+
+    # start the events of a test, ending the previous one
+    def begin(self, dut, name):
+        self.end()
+        self.log = dut._log
+        self.name = name
+        self.t0 = get_sim_time('ps')
+        self.count = 0
+        self.skews = []
+        if not self.compare:
+            self.rewrite()
+        elif self.missing:
+            if not self.warned:
+                self.log.warning(f"{self.path} not found, not comparing against RTL: "
+                                 "run the RTL simulation first to record it")
+                self.warned = True
+            self.name = None
+        elif name in self.sections:
+            self.f = io.BytesIO(self.sections[name])
+            self.log.info(f"Comparing decoded events against {self.path}")
+        else:
+            self.log.warning(f"{self.path} has no events for {name}, not comparing")
+            self.name = None
+
+    def end(self):
+        if self.name is None:
+            return
+        if self.compare:
+            record = self.next_rtl()
+            if record is not None:
+                self.log.warning(f"{self.name}: gate-level run stopped before RTL event {self.count} ({describe(record[0], record[2])})")
+            if self.skews:
+                self.log.info(f"{self.name}: {len(self.skews)} events match RTL, skew min {min(self.skews) / 1e3:+.3f} ns "
+                              f"max {max(self.skews) / 1e3:+.3f} ns mean {sum(self.skews) / len(self.skews) / 1e3:+.3f} ns")
+        else:
+            self.sections[self.name] = bytes(self.events)
+        self.name = None
+
+    def write(self, kind, payload):
+        record = RECORD.pack(kind, get_sim_time('ps') - self.t0) + PAYLOAD[kind].pack(*payload)
+        self.events += record
+        self.f.write(record)
+        self.f.flush()
+
+    def next_rtl(self):
+        return read_record(self.f)
+
+    def event(self, kind, payload):
+        if self.name is None:
+            return
+        if not self.compare:
+            self.write(kind, payload)
+            self.count += 1
+            return
+
+        t_ps = get_sim_time('ps') - self.t0
+        record = self.next_rtl()
+        got = describe(kind, payload)
+        if record is None:
+            self.name = None
+            raise AssertionError(f"event {self.count}: {got} at {t_ps / 1e6:.3f} us, but RTL has no more events")
+        rtl_kind, rtl_t_ps, rtl_payload = record
+        if (rtl_kind, rtl_payload) != (kind, payload):
+            self.name = None
+            raise AssertionError(f"event {self.count}: {got} at {t_ps / 1e6:.3f} us, "
+                                 f"RTL has {describe(rtl_kind, rtl_payload)} at {rtl_t_ps / 1e6:.3f} us")
+        skew = t_ps - rtl_t_ps
+        self.skews.append(skew)
+        self.log.info(f"event {self.count}: {got} matches RTL, skew {skew / 1e3:+.3f} ns")
+        self.count += 1
+
+    def char(self, c):
+        self.event(CHAR, (int(c.bitmap[::-1], 2), NO_COLOR if c.color is None else int(c.color, 2)))
+
+    def echo(self, data):
+        self.event(ECHO, (data,))
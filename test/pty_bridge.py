@@ -0,0 +1,150 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: MIT
+
+# Bridge between a pseudo-terminal and the simulated chip: bytes written to
+# the pty by any host program are sent to the UART RX pin, and bytes coming
+# out of the UART TX pin are written back to the pty.
+
+import errno
+import fcntl
+import os
+import struct
+import termios
+import time
+import tty
+
+import cocotb
+from cocotb.triggers import Timer
+from cocotb.utils import get_sim_time
+
+
+class PtyBridge():
+    # do_tx / do_rx are the testbench UART driver and monitor coroutines.
+    # time_scale is the number of wall-clock seconds per simulated second
+    # (0 = run the simulation as fast as possible). At most buffer_size bytes
+    # are taken from the pty ahead of the UART driver. This does not hold the
+    # host back: the kernel keeps accepting its writes into the pty's own
+    # buffer (several KB) until that fills up too. The bytes queued there are
+    # reported as the pty backlog.
+    def __init__(self, dut, uart_rx, uart_tx, do_tx, do_rx, baud=9600,
+                 time_scale=0.0, buffer_size=64, link=None):
+        self.dut = dut
+        self.uart_rx = uart_rx
+        self.uart_tx = uart_tx
+        self.do_tx = do_tx
+        self.do_rx = do_rx
+        self.baud = baud
+        self.time_scale = time_scale
+        self.buffer_size = buffer_size
+
+        self.master, self.slave = os.openpty()
+        # no echo or newline translation: the host sees the chip's bytes only
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.name = os.ttyname(self.slave)
+        self.link = link
+        if link:
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(self.name, link)
+
+        self.fifo = bytearray()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.dropped = 0
+        self.max_fill = 0
+        self.max_backlog = 0
+        self.last_activity = None
+
+    # bytes written by the host that are still queued in the pty
+    def backlog(self):
+        try:
+            return struct.unpack("i", fcntl.ioctl(self.master, termios.FIONREAD, b"\0\0\0\0"))[0]
+        except OSError:
+            return 0
+
+    def poll(self):
+        self.max_backlog = max(self.max_backlog, self.backlog())
+        room = self.buffer_size - len(self.fifo)
+        if room <= 0:
+            return
+        try:
+            data = os.read(self.master, room)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EIO):
+                return
+            raise
+        if data:
+            self.fifo += data
+            self.bytes_in += len(data)
+            self.max_fill = max(self.max_fill, len(self.fifo))
+            self.last_activity = time.monotonic()
+
+    # hold the simulation back so it does not run ahead of time_scale
+    def pace(self):
+        if not self.time_scale:
+            return
+        target = self.wall_t0 + (get_sim_time('sec') - self.sim_t0) * self.time_scale
+        delay = target - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def echo(self):
+        while True:
+            data = await self.do_rx(self.dut, self.uart_tx, self.baud)
+            try:
+                os.write(self.master, bytes([data]))
+                self.bytes_out += 1
+            except BlockingIOError:
+                # host is not reading its side of the pty
+                self.dropped += 1
+            self.last_activity = time.monotonic()
+
+    # run until the host has been idle for idle_timeout wall-clock seconds
+    # after its first byte, until no byte has arrived connect_timeout seconds
+    # after start-up, or until duration simulated ms have elapsed
+    async def run(self, idle_timeout=5.0, connect_timeout=30.0, duration=None):
+        self.dut._log.info(f"PTY bridge on {self.link or self.name}")
+        self.wall_t0 = time.monotonic()
+        self.sim_t0 = get_sim_time('sec')
+        echo_task = cocotb.start_soon(self.echo())
+        bit_time = int(1.0 / self.baud * 1e12)
+
+        try:
+            while True:
+                self.poll()
+                if self.fifo:
+                    data = self.fifo.pop(0)
+                    await self.do_tx(self.uart_rx, self.baud, data)
+                else:
+                    await Timer(bit_time, units="ps")
+                self.pace()
+
+                if duration is not None and (get_sim_time('sec') - self.sim_t0) * 1e3 >= duration:
+                    break
+                if self.last_activity is not None and not self.fifo \
+                        and time.monotonic() - self.last_activity > idle_timeout:
+                    break
+                if self.last_activity is None and time.monotonic() - self.wall_t0 > connect_timeout:
+                    self.dut._log.warning(f"PTY bridge: no host connected within {connect_timeout} s")
+                    break
+        finally:
+            echo_task.kill()
+            self.close()
+
+        self.report()
+
+    def report(self):
+        sim_s = get_sim_time('sec') - self.sim_t0
+        wall_s = time.monotonic() - self.wall_t0
+        log = self.dut._log
+        log.info(f"PTY bridge: {self.bytes_in} bytes in, {self.bytes_out} bytes echoed ({self.dropped} dropped), max buffer fill {self.max_fill}/{self.buffer_size}, max pty backlog {self.max_backlog}")
+        log.info(f"PTY bridge: {sim_s * 1e3:.3f} ms simulated in {wall_s:.3f} s wall ({wall_s / sim_s if sim_s else 0:.1f} wall s per sim s)")
+        if sim_s:
+            log.info(f"PTY bridge: {self.bytes_in / sim_s:.1f} B/s in, {self.bytes_out / sim_s:.1f} B/s echoed (simulated time)")
+
+    def close(self):
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+        os.close(self.master)
+        os.close(self.slave)
@@ -0,0 +1,111 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: MIT
+
+# Replay of a host capture (see ../capture.py) into the UART RX pin, with a
+# reference model of the display that decoded frames are checked against.
+
+import collections
+
+from cocotb.triggers import Timer
+from cocotb.utils import get_sim_time
+
+from chipmodel import ChipModel
+
+
+# Reference model of the chip's character and color buffers over time.
+# Updates are logged with their simulation time so that a frame can be checked
+# against the values each character could have had when the chip latched it.
+class DisplayTimeline():
+    def __init__(self, num_chars, ext_refresh=False):
+        self.num_chars = num_chars
+        self.chip = ChipModel(num_chars, ext_refresh)
+        # state before the first logged update
+        self.buf = list(self.chip.buf)
+        self.base = self.chip.base
+        self.updates = collections.deque()  # (time_ns, position, (char, color))
+
+    def apply(self, t_ns, b):
+        update = self.chip.apply(b)
+        if update is not None:
+            self.updates.append((t_ns,) + update)
+
+    # forget updates older than t_ns, folding them into the initial state
+    def prune(self, t_ns):
+        while self.updates and self.updates[0][0] < t_ns:
+            _, pos, entry = self.updates.popleft()
+            self.buf[pos] = entry
+            self.base = (pos + 1) % self.num_chars
+
+    # all values each position (and the ring base) took during [t1, t2]
+    def candidates(self, t1, t2):
+        buf = list(self.buf)
+        base = self.base
+        bases = None
+        values = None
+        for t, pos, entry in self.updates:
+            if t > t2:
+                break
+            if t > t1 and values is None:
+                bases = {base}
+                values = [{v} for v in buf]
+            buf[pos] = entry
+            base = (pos + 1) % self.num_chars
+            if values is not None:
+                bases.add(base)
+                values[pos].add(entry)
+        if values is None:
+            bases = {base}
+            values = [{v} for v in buf]
+        return bases, values
+
+    def state(self, t_ns):
+        bases, values = self.candidates(t_ns, t_ns)
+        base = min(bases)
+        return [min(values[(base + i) % self.num_chars]) for i in range(self.num_chars)]
+
+    # True if a frame starting at t_frame, whose characters were sent starting
+    # at t_chars, can be explained by the updates around those times
+    def check(self, t_frame, t_chars, frame, match, slack_ns):
+        bases, _ = self.candidates(t_frame - slack_ns, t_frame + slack_ns)
+        per_char = [self.candidates(t - slack_ns, t + slack_ns)[1] for t in t_chars]
+        for base in bases:
+            if all(any(match(frame[i], v) for v in per_char[i][(base + i) % self.num_chars])
+                   for i in range(self.num_chars)):
+                return True
+        return False
+
+
+class CaptureReplay():
+    # speedup > 0 replays the capture's inter-byte timing compressed by that
+    # factor, speedup = 0 sends at maximum line rate; idle gaps longer than
+    # max_gap_ms (if given) are shortened to max_gap_ms
+    def __init__(self, dut, uart_rx, do_tx, records, timeline, baud=9600,
+                 speedup=1.0, max_gap_ms=None):
+        self.dut = dut
+        self.uart_rx = uart_rx
+        self.do_tx = do_tx
+        self.records = records
+        self.timeline = timeline
+        self.baud = baud
+        self.speedup = speedup
+        self.max_gap_us = max_gap_ms * 1e3 if max_gap_ms is not None else None
+        self.bytes_sent = 0
+        self.done = False
+
+    async def run(self):
+        t_prev_us = None
+        t_target = get_sim_time('ns')
+        for t_us, b in self.records:
+            if self.speedup and t_prev_us is not None:
+                gap_us = t_us - t_prev_us
+                if self.max_gap_us is not None:
+                    gap_us = min(gap_us, self.max_gap_us)
+                t_target += gap_us * 1e3 / self.speedup
+                delay = t_target - get_sim_time('ns')
+                if delay > 0:
+                    await Timer(int(delay), units="ns")
+            t_prev_us = t_us
+            await self.do_tx(self.uart_rx, self.baud, b)
+            self.timeline.apply(get_sim_time('ns'), b)
+            self.bytes_sent += 1
+        self.done = True
@@ -6,11 +6,26 @@ from cocotb.clock import Clock
 import cocotb.result
 from cocotb.triggers import Timer, Edge, with_timeout
 from cocotb.utils import get_sim_time
+import os
 import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pty_bridge import PtyBridge
+from replay import DisplayTimeline, CaptureReplay
+from frame_trace import FrameTrace
+from capture import CaptureWriter, read_capture, capture_baud
+from char_convert import rom_words, ADDR_MIN, ADDR_MAX, DATA_WIDTH
+from colorgen import color_table, rom_params
+
+# RTL runs record decoded events, gate-level runs (GATES=yes) diff against them
+TRACE = FrameTrace(os.environ.get("FRAME_TRACE", "rtl_trace.bin"), compare=os.environ.get("GATES") == "yes")
 
 
 @cocotb.test(timeout_time=50, timeout_unit='ms')
 async def test_2chars(dut):
+    TRACE.begin(dut, "test_2chars")
     dut._log.info("Start")
 
     # Set the clock period to 50 ns (20 MHz)
@@ -73,6 +88,7 @@ async def test_2chars(dut):
 
 @cocotb.test(timeout_time=50, timeout_unit='ms')
 async def test_4chars(dut):
+    TRACE.begin(dut, "test_4chars")
     dut._log.info("Start")
 
     # Set the clock period to 50 ns (20 MHz)
@@ -149,6 +165,7 @@ async def test_4chars(dut):
 
 @cocotb.test(timeout_time=60, timeout_unit='ms')
 async def test_8chars(dut):
+    TRACE.begin(dut, "test_8chars")
     dut._log.info("Start")
 
     # Set the clock period to 50 ns (20 MHz)
@@ -194,6 +211,7 @@ async def test_8chars(dut):
 
 @cocotb.test(timeout_time=10, timeout_unit='ms')
 async def test_uart_loopback(dut):
+    TRACE.begin(dut, "test_uart_loopback")
     dut._log.info("Start")
 
     # Set the clock period to 50 ns (20 MHz)
@@ -228,6 +246,7 @@ async def trigger_refresh(dut, uart_rx):
 
 @cocotb.test(timeout_time=50, timeout_unit='ms')
 async def test_uart_refresh(dut):
+    TRACE.begin(dut, "test_uart_refresh")
     dut._log.info("Start")
 
     # Set the clock period to 50 ns (20 MHz)
@@ -281,6 +300,7 @@ async def test_uart_refresh(dut):
 
 @cocotb.test(timeout_time=50, timeout_unit='ms')
 async def test_uart_color(dut):
+    TRACE.begin(dut, "test_uart_color")
     dut._log.info("Start")
 
     # Set the clock period to 50 ns (20 MHz)
@@ -356,6 +376,211 @@ async def test_uart_color(dut):
     assert c4.color == COLOR_LIST[15]
 
 
+@cocotb.test(timeout_time=250, timeout_unit='ms')
+async def test_uart_dimmer(dut):
+    TRACE.begin(dut, "test_uart_dimmer")
+    dut._log.info("Start")
+
+    # Set the clock period to 50 ns (20 MHz)
+    clock = Clock(dut.clk, 50, units="ns")
+    cocotb.start_soon(clock.start())
+
+    # signals
+    uart_rx = dut.ui_in[3]
+    led = dut.uo_out[0]
+
+    # GPIO config
+    do_gpio_config(dut, num_chars=8, fixed_color=1)
+
+    # reset
+    await do_reset(dut)
+
+    assert led.value == 0
+
+    # every color at every dimmer level, 8 colors per frame
+    for first in (0, 8):
+        colors = range(first, first + 8)
+        dut._log.info(f"Sending: colors {first}..{first + 7}, one per char")
+        for color in colors:
+            await do_tx(uart_rx, 9600, 0x80 | color)
+            await do_tx(uart_rx, 9600, ord('A') + color)
+
+        for dimmer in range(4):
+            dut.ui_in[4].value = dimmer & 1
+            dut.ui_in[5].value = dimmer >> 1
+
+            # wait for next refresh
+            await wait_led_reset(dut, led)
+
+            # parse LED matrix update
+            clist = []
+            for i in range(8):
+                clist.append(await get_char(dut, led, verbose=False, dimmer=dimmer))
+            await check_led_reset(dut, led)
+
+            # check LED matrix state: colors dimmed as in the palette generator
+            # (a color dimmed to black shows as a blank character)
+            for c, color in zip(clist, colors):
+                expected = COLOR_TABLE[dimmer][color]
+                if int(expected, 2):
+                    assert c.bitmap == get_char_bitmap(ord('A') + color)
+                    assert c.color == expected, f"color {color} at dimmer {dimmer}"
+                else:
+                    assert c.color is None
+
+
+# connect host tools to the simulated chip through a pty, e.g.:
+#   make -B TESTCASE=test_pty_bridge PTY_BRIDGE=1 PTY_BRIDGE_LINK=/tmp/charmatrix
+#   python ../sender.py /tmp/charmatrix message.txt
+@cocotb.test(skip=os.environ.get("PTY_BRIDGE") is None)
+async def test_pty_bridge(dut):
+    # the echoes depend on when an interactive host sends its bytes: not traced
+    TRACE.end()
+    dut._log.info("Start")
+
+    # Set the clock period to 50 ns (20 MHz)
+    clock = Clock(dut.clk, 50, units="ns")
+    cocotb.start_soon(clock.start())
+
+    # signals
+    uart_rx = dut.ui_in[3]
+    uart_tx = dut.uo_out[4]
+
+    # GPIO config
+    do_gpio_config(dut, num_chars=int(os.environ.get("PTY_BRIDGE_CHARS", 2)), uart_loopback=1)
+
+    # reset
+    await do_reset(dut)
+
+    bridge = PtyBridge(dut, uart_rx, uart_tx, do_tx, do_rx,
+                       time_scale=float(os.environ.get("PTY_BRIDGE_TIME_SCALE", 0)),
+                       buffer_size=int(os.environ.get("PTY_BRIDGE_BUFFER", 64)),
+                       link=os.environ.get("PTY_BRIDGE_LINK"))
+    await bridge.run(idle_timeout=float(os.environ.get("PTY_BRIDGE_IDLE", 5)),
+                     connect_timeout=float(os.environ.get("PTY_BRIDGE_CONNECT", 30)))
+
+
+# replay a host capture (see ../capture.py) and check every decoded frame, e.g.:
+#   make -B TESTCASE=test_capture_replay REPLAY_CAPTURE=trace.cap REPLAY_SPEEDUP=10
+@cocotb.test(skip=os.environ.get("REPLAY_CAPTURE") is None)
+async def test_capture_replay(dut):
+    TRACE.begin(dut, "test_capture_replay")
+    dut._log.info("Start")
+
+    # Set the clock period to 50 ns (20 MHz)
+    clock = Clock(dut.clk, 50, units="ns")
+    cocotb.start_soon(clock.start())
+
+    # REPLAY_SPEEDUP=0 sends at maximum line rate
+    max_gap = os.environ.get("REPLAY_MAX_GAP_MS")
+    divergences = await replay_capture(dut, os.environ["REPLAY_CAPTURE"],
+                                       num_chars=int(os.environ.get("REPLAY_CHARS", 2)),
+                                       ext_refresh=int(os.environ.get("REPLAY_EXT_REFRESH", 0)),
+                                       fixed_color=int(os.environ.get("REPLAY_FIXED_COLOR", 1)),
+                                       speedup=float(os.environ.get("REPLAY_SPEEDUP", 1)),
+                                       max_gap_ms=float(max_gap) if max_gap else None)
+    assert divergences == 0
+
+
+@cocotb.test(timeout_time=200, timeout_unit='ms')
+async def test_capture_replay_roundtrip(dut):
+    TRACE.begin(dut, "test_capture_replay_roundtrip")
+    dut._log.info("Start")
+
+    # Set the clock period to 50 ns (20 MHz)
+    clock = Clock(dut.clk, 50, units="ns")
+    cocotb.start_soon(clock.start())
+
+    # short capture with gaps, color commands, letters and spaces (times in s)
+    records = [(0.000, 0x87), (0.000, ord('H')), (0.001, ord('i')), (0.005, ord(' ')),
+               (0.006, 0x8C), (0.006, ord('y')), (0.030, ord('o')), (0.031, ord(' ')),
+               (0.035, 0x83), (0.036, ord('!'))]
+    fd, path = tempfile.mkstemp(suffix=".cap")
+    os.close(fd)
+    try:
+        capture = CaptureWriter(path)
+        for t, b in records:
+            capture.write(bytes([b]), t)
+        capture.close()
+
+        # once at maximum line rate, once with the original timing compressed 4x
+        for speedup in [0, 4]:
+            dut._log.info(f"Replay with speedup {speedup}")
+            divergences = await replay_capture(dut, path, num_chars=2, ext_refresh=0,
+                                               fixed_color=1, speedup=speedup)
+            assert divergences == 0
+    finally:
+        os.remove(path)
+
+
+# replay a capture into a freshly reset chip, checking every decoded frame
+# against the reference display; returns the number of divergent frames
+async def replay_capture(dut, path, num_chars, ext_refresh, fixed_color, speedup, max_gap_ms=None):
+    # signals
+    uart_rx = dut.ui_in[3]
+    led = dut.uo_out[0]
+
+    # GPIO config
+    do_gpio_config(dut, num_chars=num_chars, ext_refresh=ext_refresh, fixed_color=fixed_color)
+
+    # reset
+    await do_reset(dut)
+
+    # start replay
+    baud = capture_baud(path)
+    timeline = DisplayTimeline(num_chars, ext_refresh)
+    replay = CaptureReplay(dut, uart_rx, do_tx, read_capture(path), timeline, baud=baud,
+                           speedup=speedup, max_gap_ms=max_gap_ms)
+    replay_task = cocotb.start_soon(replay.run())
+
+    # a character matches a reference (char, color) if bitmaps agree, and colors too when fixed
+    def match(c, ref):
+        return c.bitmap == get_char_bitmap(ref[0]) and \
+            (not fixed_color or c.color is None or c.color == COLOR_LIST[ref[1]])
+
+    # RX latches a byte within one bit time of the end of its stop bit
+    slack_ns = 1e9 / baud
+
+    frames = 0
+    divergences = 0
+    t_done = None
+    await wait_led_reset(dut, led)
+    while True:
+        # wait for next refresh, stop once a whole frame follows the last byte
+        try:
+            await with_timeout(wait_led_high(dut, led), 30, 'ms')
+        except cocotb.result.SimTimeoutError:
+            if replay.done:
+                break
+            continue
+        if replay.done and t_done is None:
+            t_done = get_sim_time('ns')
+
+        # parse LED matrix update, noting when each character starts
+        t_frame = get_sim_time('ns')
+        t_chars = []
+        frame = []
+        for i in range(num_chars):
+            await wait_led_high(dut, led)
+            t_chars.append(get_sim_time('ns'))
+            frame.append(await get_char(dut, led, verbose=False))
+        await check_led_reset(dut, led)
+
+        if not timeline.check(t_frame, t_chars, frame, match, slack_ns):
+            divergences += 1
+            dut._log.warning(f"frame {frames} at {t_frame / 1e6:.3f} ms after {replay.bytes_sent} bytes: "
+                             f"expected '{ref_text(timeline.state(t_frame))}', got '{frame_text(frame)}'")
+        frames += 1
+        timeline.prune(get_sim_time('ns') - slack_ns)
+
+        if t_done is not None and t_frame > t_done:
+            break
+
+    await replay_task
+    dut._log.info(f"Replayed {replay.bytes_sent} bytes, {frames} frames, {divergences} divergences")
+    return divergences
+
+
 # HELPER FUNCTIONS
 
 async def do_reset(dut):
@@ -388,32 +613,21 @@ def do_gpio_config(dut, num_chars=2, uart_loopback=0, led_dimmer=0, ext_refresh=
     # GPIO IN/OUT
     dut.uio_in.value = 0
 
-CHAR_ROM = [s.strip()[::-1] for s in open('font.bin').readlines()]
+# packed 35-bit words of the character ROM, as in font.bin
+CHAR_ROM = rom_words()
 def get_char_bitmap(c):
-    if c >= 32 and c <= 126:
-        i = c - 32
+    if c >= ADDR_MIN and c <= ADDR_MAX:
+        i = c - ADDR_MIN
     else:
         i = -1
-    return CHAR_ROM[i]
-
-COLOR_LIST = [
-    "000000001100110000000000",
-    "010011001100110000000000",
-    "100110011100110000000000",
-    "110011001011001000000000",
-    "110011000110011000000000",
-    "110011000001100100000000",
-    "110011000000000000110011",
-    "110011000000000001111111",
-    "110011000000000011001100",
-    "011111110000000011001100",
-    "001100110000000011001100",
-    "000000000001100111001100",
-    "000000000110011011001100",
-    "000000001011001011001100",
-    "000000001100110010011001",
-    "000000001100110001001100"
-]
+    return format(int(CHAR_ROM[i]), '0%db' % DATA_WIDTH)[::-1]
+
+BITMAP_CHARS = {get_char_bitmap(c): chr(c) for c in range(32, 127)}
+
+# GRB bit strings of the color ROM, COLOR_TABLE[dimmer][index], for the
+# palette parameters src/color_rom.v was generated with
+COLOR_TABLE = color_table(**rom_params())
+COLOR_LIST = COLOR_TABLE[0]
 
 async def do_tx(uart_rx, baud, data):
     # prepare random test data
@@ -444,6 +658,7 @@ async def do_rx(dut, uart_tx, baud):
     await Timer(int(1.0 / baud * 1e12), units="ps")
     assert uart_tx.value == 1
 
+    TRACE.echo(data)
     return data
 
 # class to hold character's bitmap & color
@@ -452,8 +667,15 @@ class Char():
         self.bitmap = bitmap
         self.color = color
 
+# text shown by decoded characters (unknown bitmaps as '?') and by reference (char, color) pairs
+def frame_text(frame):
+    return "".join([BITMAP_CHARS.get(c.bitmap, "?") for c in frame])
+
+def ref_text(ref):
+    return "".join([chr(c) if 32 <= c <= 126 else "?" for c, _ in ref])
+
 # read 5x7 character
-async def get_char(dut, led):
+async def get_char(dut, led, verbose=True, dimmer=0):
     cseq = []
     color_set = set()
     for count in range(35):
@@ -463,23 +685,28 @@ async def get_char(dut, led):
             color_set.add("".join([str(x) for x in bitseq]))
         else:
             cseq.append(0)
-        dut._log.info(f"{count}: {bitseq}")
+        if verbose:
+            dut._log.info(f"{count}: {bitseq}")
 
-    # same color for all LEDS in a given character, and a valid color
-    assert len(color_set) == 1
-    assert list(color_set)[0] in COLOR_LIST
+    # same color for all LEDS in a given character, and a valid color at the
+    # configured dimmer level (blank characters, e.g. space, have no color)
+    assert len(color_set) <= 1
+    assert color_set <= set(COLOR_TABLE[dimmer])
 
     # print character
-    print()
-    for i in range(7):
-        linestring = "".join(["O" if x==1 else "." for x in cseq[i*5:(i+1)*5]])
-        dut._log.info(linestring)
-    print()
+    if verbose:
+        print()
+        for i in range(7):
+            linestring = "".join(["O" if x==1 else "." for x in cseq[i*5:(i+1)*5]])
+            dut._log.info(linestring)
+        print()
 
     bitmap = "".join([str(x) for x in cseq])
-    color = list(color_set)[0]
+    color = list(color_set)[0] if color_set else None
 
-    return Char(bitmap, color)
+    c = Char(bitmap, color)
+    TRACE.char(c)
+    return c
 
 # read 24 color bits (G / R / B)
 async def get_GRB(dut, led):
@@ -504,6 +731,10 @@ async def get_GRB(dut, led):
 
     return bitseq
 
+async def wait_led_high(dut, led):
+    while led.value == 0:
+        await Edge(dut.uo_out)
+
 async def check_led_reset(dut, led):
         did_timeout = False
         assert led.value == 0
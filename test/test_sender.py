@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: © 2024 Tiny Tapeout
+# SPDX-License-Identifier: MIT
+
+# Host-side tests for ../sender.py against its pty loopback stand-in:
+#   python -m pytest test/test_sender.py
+
+import os
+import sys
+
+import pytest
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sender import BAUD, DisplayState, PtyLoopback, SendError, WindowedSender
+
+
+def send_to_loopback(data, num_chars=4, window=8, max_recoveries=8, loopback_cls=PtyLoopback, **kwargs):
+    loopback = loopback_cls(display=DisplayState(num_chars), **kwargs)
+    s = serial.Serial(loopback.name, BAUD, 8, "N", 1, timeout=0.002)
+    sender = WindowedSender(s, window=window, display=DisplayState(num_chars), max_recoveries=max_recoveries)
+    try:
+        return sender, sender.send(data), loopback
+    finally:
+        s.close()
+        loopback.close()
+
+
+def test_clean_link():
+    data = b"Hello, world! \x85colors\x8a too"
+    sender, stats, loopback = send_to_loopback(data)
+    assert stats.confirmed == len(data)
+    assert stats.recoveries == 0
+    assert loopback.display.chars == sender.display.chars
+
+
+def test_lossy_link():
+    data = bytes(range(32, 127)) * 3 + b"\x83end"
+    sender, stats, loopback = send_to_loopback(data, seed=1, drop=0.02, corrupt=0.02)
+    assert stats.recoveries > 0
+    assert stats.confirmed == len(data)
+    assert loopback.display.chars == sender.display.chars
+
+
+def test_no_echo():
+    with pytest.raises(SendError) as e:
+        send_to_loopback(b"hi", max_recoveries=3, drop=1.0)
+    assert e.value.stats.confirmed == 0
+
+
+# a link that always corrupts one byte value
+class FlipZLoopback(PtyLoopback):
+    def mangle(self, b):
+        return b ^ 1 if b == ord('Z') else b
+
+
+def test_byte_always_corrupted():
+    # the bytes replayed to restore the display are confirmed at every
+    # recovery, which must not count as progress
+    with pytest.raises(SendError) as e:
+        send_to_loopback(b"abcZ", max_recoveries=3, loopback_cls=FlipZLoopback)
+    assert e.value.stats.confirmed == 3
+    assert e.value.stats.recoveries == 4
+
+
+def test_empty_window():
+    with pytest.raises(ValueError):
+        WindowedSender(None, window=0)